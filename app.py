@@ -1,15 +1,39 @@
-from flask import Flask, request, render_template, send_file, redirect, url_for
+from flask import Flask, request, render_template, send_file, redirect, url_for, jsonify, make_response
 from jinja2 import DictLoader
+from markupsafe import Markup, escape
+import copy
+import gzip
+import hashlib
 import json
 import os
-from datetime import datetime, timedelta
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from datetime import datetime, timedelta, date
 import uuid
 
+from job_workers import run_export_part, run_report_part
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 app = Flask(__name__)
 
 
 ACCOUNTS_FILE = "accounts.json"
 TRANSACTIONS_FILE = "transactions.json"
+BUDGETS_FILE = "budgets.json"
+JOBS_DIR = "job_artifacts"
+JOB_TTL = timedelta(hours=1)
+REPORT_BATCH_ACCOUNTS = 500
+COMPRESS_MIN_SIZE = 500
+COMPRESS_MIMETYPES = {"text/html", "application/json", "text/css", "application/javascript"}
+INLINE_CHART_DATA = True
 
 
 def load_json(filename):
@@ -24,15 +48,21 @@ def save_json(filename, data):
 
 
 accounts = load_json(ACCOUNTS_FILE)  
-transactions = load_json(TRANSACTIONS_FILE)  
+raw_transactions = load_json(TRANSACTIONS_FILE)  
+budgets = load_json(BUDGETS_FILE)  
 
 if not isinstance(accounts, dict):
     accounts = {}
-if not isinstance(transactions, dict):
-    transactions = {}
+if not isinstance(raw_transactions, dict):
+    raw_transactions = {}
+if not isinstance(budgets, dict):
+    budgets = {}
 
 CATEGORIES = ["Salary", "Rent", "Groceries", "Utilities", "Transport", "Fees", "Entertainment", "Other"]
 
+INCOME_TYPES = {"Deposit", "Transfer In"}
+EXPENSE_TYPES = {"Expense", "Withdraw", "Transfer Out"}
+
 
 class Transaction:
     def __init__(self, type_, amount, details="", category="Other", date=None, id=None):
@@ -55,7 +85,7 @@ class Transaction:
         }
 
 
-for acc, tlist in list(transactions.items()):
+for acc, tlist in list(raw_transactions.items()):
     new_list = []
     for t in tlist:
         
@@ -75,17 +105,814 @@ for acc, tlist in list(transactions.items()):
             except Exception:
                 t["amount"] = 0
         new_list.append(t)
-    transactions[acc] = new_list
+    raw_transactions[acc] = new_list
+
+
+class ShardedMap:
+    """Immutable mapping split into a fixed number of hash shards.
+
+    ``update`` copies the shard list and only the shards holding the changed
+    keys, so a write costs O(shards + n / shards) instead of a copy of the
+    whole mapping, and every shard it didn't touch is shared with the old map.
+    """
+
+    SHARDS = 256
+
+    def __init__(self, shards=None):
+        self._shards = shards if shards is not None else ({},) * self.SHARDS
+
+    @classmethod
+    def from_dict(cls, data):
+        shards = [{} for _ in range(cls.SHARDS)]
+        for key, value in data.items():
+            shards[hash(key) % cls.SHARDS][key] = value
+        return cls(tuple(shards))
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def __contains__(self, key):
+        return key in self._shard(key)
+
+    def __getitem__(self, key):
+        return self._shard(key)[key]
+
+    def __iter__(self):
+        for shard in self._shards:
+            yield from shard
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+    def get(self, key, default=None):
+        return self._shard(key).get(key, default)
+
+    def items(self):
+        for shard in self._shards:
+            yield from shard.items()
+
+    def update(self, changes):
+        """Return a new map with ``changes`` applied."""
+        shards = list(self._shards)
+        for key, value in changes.items():
+            i = hash(key) % len(shards)
+            if shards[i] is self._shards[i]:
+                shards[i] = dict(shards[i])
+            shards[i][key] = value
+        return ShardedMap(tuple(shards))
+
+    def set(self, key, value):
+        return self.update({key: value})
+
+
+class LedgerSnapshot:
+    """A pinned, read-only version of the ledger and its indexes.
+
+    Nothing reachable from a snapshot is ever mutated, so a long scan or a
+    series of index queries can hold on to one while writers publish newer
+    versions.
+    """
+
+    def __init__(self, version, chunks, index=None, timelines=None):
+        self.version = version
+        self._chunks = chunks
+        self.index = index
+        self.timelines = timelines if timelines is not None else ShardedMap()
+
+    def __contains__(self, acc):
+        return acc in self._chunks
+
+    def get(self, acc):
+        for chunk in self._chunks.get(acc, ()):
+            yield from chunk
+
+    def items(self):
+        for acc in self._chunks:
+            yield acc, self.get(acc)
+
+    def to_dict(self):
+        return {acc: list(self.get(acc)) for acc in self._chunks}
+
+    def partition(self, size=None):
+        """Split into plain {account: chunks} dicts of at most ``size`` accounts.
+
+        These are what job parts receive: they pickle without the indexes and
+        still share the chunk tuples with the snapshot.
+        """
+        items = list(self._chunks.items())
+        size = size or len(items) or 1
+        return [dict(items[i:i + size]) for i in range(0, len(items), size)] or [{}]
+
+
+class TransactionStore:
+    """Copy-on-write transaction storage.
+
+    Each account's transactions live in a tuple of fixed-size chunks. A
+    write rebuilds only the chunk it touches, derives new versions of the
+    range-total index and balance timelines, and publishes all of them as
+    one snapshot; readers call ``snapshot()`` and never take the lock.
+    """
+
+    CHUNK_SIZE = 256
+
+    def __init__(self, data):
+        self.lock = threading.RLock()
+        chunks = ShardedMap.from_dict({acc: self._split(tlist) for acc, tlist in data.items()})
+        self._current = LedgerSnapshot(0, chunks, LedgerIndex.build(data), build_timelines(data))
+
+    def _split(self, tlist):
+        n = self.CHUNK_SIZE
+        return tuple(tuple(tlist[i:i + n]) for i in range(0, len(tlist), n))
+
+    def _appended(self, chunks, tx):
+        if chunks and len(chunks[-1]) < self.CHUNK_SIZE:
+            return chunks[:-1] + (chunks[-1] + (tx,),)
+        return chunks + ((tx,),)
+
+    def _stored(self, chunks, txid):
+        for chunk in chunks:
+            for t in chunk:
+                if t.get("id") == txid:
+                    return t
+        return None
+
+    def _rewritten(self, chunks, txid, new_tx):
+        for i, chunk in enumerate(chunks):
+            for j, t in enumerate(chunk):
+                if t.get("id") == txid:
+                    chunk = chunk[:j] + ((new_tx,) if new_tx is not None else ()) + chunk[j + 1:]
+                    return chunks[:i] + ((chunk,) if chunk else ()) + chunks[i + 1:]
+        return chunks
+
+    def _publish(self, updates, index, timelines):
+        current = self._current
+        self._current = LedgerSnapshot(current.version + 1, current._chunks.update(updates), index, timelines)
+
+    def snapshot(self):
+        return self._current
+
+    def __contains__(self, acc):
+        return acc in self._current
+
+    def find(self, acc, txid):
+        return next((t for t in self._current.get(acc) if t.get("id") == txid), None)
+
+    def create(self, acc):
+        with self.lock:
+            current = self._current
+            if acc not in current:
+                self._publish({acc: ()}, current.index, current.timelines)
+
+    def append(self, acc, tx):
+        with self.lock:
+            current = self._current
+            self._publish({acc: self._appended(current._chunks.get(acc, ()), tx)},
+                          current.index.add(acc, tx),
+                          track_balance(current.timelines, acc, tx))
+
+    def replace(self, old_acc, old_tx, new_acc, new_tx):
+        """Swap ``old_tx`` for ``new_tx``, moving it if the account changes.
+
+        Returns False, changing nothing, if ``old_tx`` is no longer the stored
+        version: callers look it up before taking the lock, so a concurrent
+        edit or delete may have got there first.
+        """
+        with self.lock:
+            current = self._current
+            old_chunks = current._chunks.get(old_acc, ())
+            if self._stored(old_chunks, old_tx["id"]) is not old_tx:
+                return False
+            if new_acc == old_acc:
+                updates = {old_acc: self._rewritten(old_chunks, old_tx["id"], new_tx)}
+            else:
+                updates = {old_acc: self._rewritten(old_chunks, old_tx["id"], None),
+                           new_acc: self._appended(current._chunks.get(new_acc, ()), new_tx)}
+            timelines = track_balance(current.timelines, old_acc, old_tx, sign=-1)
+            self._publish(updates,
+                          current.index.remove(old_acc, old_tx).add(new_acc, new_tx),
+                          track_balance(timelines, new_acc, new_tx))
+            return True
+
+    def remove(self, acc, tx):
+        """Drop ``tx`` from ``acc``; returns False if it was already replaced or removed."""
+        with self.lock:
+            current = self._current
+            chunks = current._chunks.get(acc, ())
+            if self._stored(chunks, tx["id"]) is not tx:
+                return False
+            self._publish({acc: self._rewritten(chunks, tx["id"], None)},
+                          current.index.remove(acc, tx),
+                          track_balance(current.timelines, acc, tx, sign=-1))
+            return True
+
+
+def tx_day(tx):
+    try:
+        return date.fromisoformat(tx.get("date", "")[:10])
+    except (TypeError, ValueError):
+        return None
+
+def tx_flow(tx):
+    if tx.get("type") in INCOME_TYPES:
+        return "income"
+    if tx.get("type") in EXPENSE_TYPES:
+        return "expense"
+    return None
+
+def parse_day(value):
+    """Parse a YYYY-MM-DD query value; empty means unbounded."""
+    if not value:
+        return None
+    return date.fromisoformat(value[:10])
+
+def month_bounds(day):
+    first = day.replace(day=1)
+    next_month = (first + timedelta(days=32)).replace(day=1)
+    return first, next_month - timedelta(days=1)
+
+
+class FenwickTree:
+    """Binary indexed tree over daily buckets, growing in either direction.
+
+    Trees are immutable: ``add`` returns a new tree. Both arrays are kept
+    in fixed-size chunks and the new tree shares every chunk the update
+    didn't touch, so a pinned tree never changes under a reader.
+    """
+
+    CHUNK_SIZE = 64
+
+    def __init__(self, base, daily):
+        self.base = base
+        self.size = len(daily)
+        tree = [0] * (self.size + 1)
+        for i, value in enumerate(daily, 1):
+            tree[i] += value
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+        self.daily = self._split(daily)
+        self.tree = self._split(tree)
+
+    @classmethod
+    def from_daily(cls, totals, size=64):
+        """Build from a {date: amount} mapping in O(n)."""
+        base = min(totals).toordinal()
+        daily = [0] * max(size, max(totals).toordinal() - base + 1)
+        for day, amount in totals.items():
+            daily[day.toordinal() - base] += amount
+        return cls(base, daily)
+
+    def _split(self, values):
+        n = self.CHUNK_SIZE
+        return [values[i:i + n] for i in range(0, len(values), n)]
+
+    def add(self, day, delta):
+        """Return a new tree with ``delta`` added to ``day``'s bucket."""
+        i = day.toordinal() - self.base
+        if i < 0 or i >= self.size:
+            # Doubling keeps the O(n) rebuild amortised across inserts.
+            daily = [v for chunk in self.daily for v in chunk]
+            base = self.base
+            if i < 0:
+                pad = max(-i, self.size)
+                daily = [0] * pad + daily
+                base -= pad
+            else:
+                daily += [0] * max(i + 1 - self.size, self.size)
+            daily[day.toordinal() - base] += delta
+            return FenwickTree(base, daily)
+        n = self.CHUNK_SIZE
+        new = copy.copy(self)
+        new.daily = list(self.daily)
+        new.tree = list(self.tree)
+        chunk = new.daily[i // n] = list(self.daily[i // n])
+        chunk[i % n] += delta
+        copied = set()
+        i += 1
+        while i <= self.size:
+            if i // n not in copied:
+                new.tree[i // n] = list(self.tree[i // n])
+                copied.add(i // n)
+            new.tree[i // n][i % n] += delta
+            i += i & -i
+        return new
+
+    def prefix(self, day):
+        """Sum of all buckets up to and including ``day``."""
+        n = self.CHUNK_SIZE
+        i = min(day.toordinal() - self.base + 1, self.size)
+        total = 0
+        while i > 0:
+            total += self.tree[i // n][i % n]
+            i -= i & -i
+        return total
+
+    def range_sum(self, start=None, end=None):
+        if start and end and start > end:
+            return 0
+        total = self.prefix(end or date.max)
+        if start and start > date.min:
+            total -= self.prefix(start - timedelta(days=1))
+        return total
+
+
+class LedgerIndex:
+    """Range totals per (account, category, flow), plus all-account aggregates.
+
+    ``trees[account][(category, flow)]`` is a FenwickTree; account ``None``
+    holds the aggregate over every account so ledger-wide reports don't need
+    to visit each account's trees. Like the trees, an index is immutable:
+    ``add`` and ``remove`` return a new index.
+    """
+
+    def __init__(self, trees=None):
+        self.trees = trees if trees is not None else ShardedMap()
+
+    @staticmethod
+    def _entry(tx):
+        day = tx_day(tx)
+        flow = tx_flow(tx)
+        if day is None or flow is None:
+            return None
+        try:
+            amount = int(tx.get("amount", 0))
+        except (TypeError, ValueError):
+            return None
+        return day, (tx.get("category", "Other"), flow), amount
+
+    @classmethod
+    def build(cls, data):
+        """Index an {account: [tx, ...]} mapping in one pass."""
+        totals = {}
+        for account, tlist in data.items():
+            for tx in tlist:
+                entry = cls._entry(tx)
+                if entry is None:
+                    continue
+                day, key, amount = entry
+                for acc in (account, None):
+                    daily = totals.setdefault(acc, {}).setdefault(key, {})
+                    daily[day] = daily.get(day, 0) + amount
+        return cls(ShardedMap.from_dict({acc: {key: FenwickTree.from_daily(daily) for key, daily in per_key.items()}
+                                         for acc, per_key in totals.items()}))
+
+    def add(self, account, tx, sign=1):
+        entry = self._entry(tx)
+        if entry is None:
+            return self
+        day, key, amount = entry
+        changes = {}
+        for acc in (account, None):
+            per_key = dict(self.trees.get(acc, {}))
+            tree = per_key.get(key) or FenwickTree(day.toordinal(), [0] * 64)
+            per_key[key] = tree.add(day, amount * sign)
+            changes[acc] = per_key
+        return LedgerIndex(self.trees.update(changes))
+
+    def remove(self, account, tx):
+        return self.add(account, tx, sign=-1)
+
+    def categories(self, account=None):
+        return tuple(dict.fromkeys(cat for cat, _ in self.trees.get(account, {})))
+
+    def total(self, account=None, category=None, start=None, end=None, flow="expense"):
+        per_key = self.trees.get(account, {})
+        categories = [category] if category else self.categories(account)
+        total = 0
+        for cat in categories:
+            tree = per_key.get((cat, flow))
+            if tree:
+                total += tree.range_sum(start, end)
+        return total
+
+
+class BalanceTimeline:
+    """Date-ordered running balances for one account, stored in blocks.
+
+    Each block keeps cumulative sums local to the block and ``offsets[i]``
+    is the balance carried into block ``i``. A change copies one block and
+    shifts the offsets after it rather than every later running balance.
+    ``insert`` and ``remove`` return a new timeline that shares the blocks
+    they didn't touch; the original is left as it was.
+    """
+
+    BLOCK_SIZE = 128
+
+    def __init__(self):
+        self.blocks = []
+        self.firsts = []
+        self.offsets = []
+
+    @classmethod
+    def build(cls, entries):
+        """Build from (key, delta) pairs in any order."""
+        timeline = cls()
+        carried = 0
+        entries = sorted(entries)
+        for i in range(0, len(entries), cls.BLOCK_SIZE):
+            part = entries[i:i + cls.BLOCK_SIZE]
+            block = {"keys": [k for k, _ in part], "deltas": [d for _, d in part], "running": [0] * len(part)}
+            timeline._recompute(block, 0)
+            timeline.blocks.append(block)
+            timeline.firsts.append(block["keys"][0])
+            timeline.offsets.append(carried)
+            carried += block["running"][-1]
+        return timeline
+
+    def _copy(self):
+        new = copy.copy(self)
+        new.blocks = list(self.blocks)
+        new.firsts = list(self.firsts)
+        new.offsets = list(self.offsets)
+        return new
+
+    def _own(self, i):
+        self.blocks[i] = {name: list(values) for name, values in self.blocks[i].items()}
+        return self.blocks[i]
+
+    def _recompute(self, block, j):
+        total = block["running"][j - 1] if j else 0
+        for k in range(j, len(block["deltas"])):
+            total += block["deltas"][k]
+            block["running"][k] = total
+
+    def _shift(self, i, delta):
+        for k in range(i + 1, len(self.offsets)):
+            self.offsets[k] += delta
+
+    def insert(self, key, delta):
+        new = self._copy()
+        new._insert(key, delta)
+        return new
+
+    def remove(self, key):
+        new = self._copy()
+        new._remove(key)
+        return new
+
+    def _insert(self, key, delta):
+        if not self.blocks:
+            self.blocks.append({"keys": [], "deltas": [], "running": []})
+            self.firsts.append(key)
+            self.offsets.append(0)
+        i = max(bisect_right(self.firsts, key) - 1, 0)
+        block = self._own(i)
+        j = bisect_left(block["keys"], key)
+        block["keys"].insert(j, key)
+        block["deltas"].insert(j, delta)
+        block["running"].insert(j, 0)
+        self._recompute(block, j)
+        self.firsts[i] = block["keys"][0]
+        self._shift(i, delta)
+        if len(block["keys"]) > 2 * self.BLOCK_SIZE:
+            self._split(i)
+
+    def _split(self, i):
+        block = self.blocks[i]
+        mid = len(block["keys"]) // 2
+        tail = {"keys": block["keys"][mid:], "deltas": block["deltas"][mid:], "running": block["running"][mid:]}
+        carried = block["running"][mid - 1]
+        for name in ("keys", "deltas", "running"):
+            del block[name][mid:]
+        self._recompute(tail, 0)
+        self.blocks.insert(i + 1, tail)
+        self.firsts.insert(i + 1, tail["keys"][0])
+        self.offsets.insert(i + 1, self.offsets[i] + carried)
+
+    def _remove(self, key):
+        i = bisect_right(self.firsts, key) - 1
+        if i < 0:
+            return
+        j = bisect_left(self.blocks[i]["keys"], key)
+        if j == len(self.blocks[i]["keys"]) or self.blocks[i]["keys"][j] != key:
+            return
+        block = self._own(i)
+        delta = block["deltas"][j]
+        for name in ("keys", "deltas", "running"):
+            del block[name][j]
+        self._shift(i, -delta)
+        if block["keys"]:
+            self._recompute(block, j)
+            self.firsts[i] = block["keys"][0]
+        else:
+            del self.blocks[i], self.firsts[i], self.offsets[i]
+
+    def balance_before(self, key):
+        """Balance after every entry that sorts before ``key``."""
+        i = bisect_left(self.firsts, key) - 1
+        if i < 0:
+            return 0
+        block = self.blocks[i]
+        j = bisect_left(block["keys"], key)
+        return self.offsets[i] + block["running"][j - 1]
+
+    def current(self):
+        if not self.blocks:
+            return 0
+        return self.offsets[-1] + self.blocks[-1]["running"][-1]
+
+    def balance_at(self, day):
+        """Balance at the end of ``day``."""
+        if day == date.max:
+            return self.current()
+        return self.balance_before(((day + timedelta(days=1)).isoformat(),))
+
+    def series(self, points=60):
+        """Up to ``points`` (day, balance) pairs spread evenly over the history."""
+        if not self.blocks:
+            return []
+        first = date.fromisoformat(self.firsts[0][0][:10])
+        last = date.fromisoformat(self.blocks[-1]["keys"][-1][0][:10])
+        span = (last - first).days
+        step = max(span / max(points - 1, 1), 1)
+        days = sorted({first + timedelta(days=round(k * step)) for k in range(int(span / step) + 1)} | {last})
+        return [(d.isoformat(), self.balance_at(d)) for d in days]
+
+
+def balance_entry(tx):
+    flow = tx_flow(tx)
+    if flow is None or tx_day(tx) is None:
+        return None
+    try:
+        amount = int(tx.get("amount", 0))
+    except (TypeError, ValueError):
+        return None
+    return (tx.get("date", ""), tx.get("id")), amount if flow == "income" else -amount
+
+def build_timelines(data):
+    timelines = {}
+    for acc, tlist in data.items():
+        entries = [e for e in map(balance_entry, tlist) if e is not None]
+        if entries:
+            timelines[acc] = BalanceTimeline.build(entries)
+    return ShardedMap.from_dict(timelines)
+
+def track_balance(timelines, acc, tx, sign=1):
+    """Return a copy of ``timelines`` with ``tx`` added to or removed from ``acc``."""
+    entry = balance_entry(tx)
+    if entry is None:
+        return timelines
+    key, delta = entry
+    timeline = timelines.get(acc, BalanceTimeline())
+    return timelines.set(acc, timeline.insert(key, delta) if sign > 0 else timeline.remove(key))
+
+
+ledger = TransactionStore(raw_transactions)
+del raw_transactions
+
+
+class AccountIndex:
+    """Account names kept sorted by name and by balance for paged listing."""
+
+    def __init__(self, balances):
+        self.names = sorted(balances)
+        self.by_balance = sorted((balance, name) for name, balance in balances.items())
+
+    def add(self, name, balance):
+        insort(self.names, name)
+        insort(self.by_balance, (balance, name))
+
+    def update(self, name, old, new):
+        i = bisect_left(self.by_balance, (old, name))
+        if i == len(self.by_balance) or self.by_balance[i] != (old, name):
+            raise KeyError(f"account {name!r} is not indexed at balance {old}")
+        del self.by_balance[i]
+        insort(self.by_balance, (new, name))
+
+    def __len__(self):
+        return len(self.names)
+
+    def page(self, sort="name", descending=False, offset=0, limit=50):
+        if sort == "balance":
+            return [name for _, name in self._slice(self.by_balance, descending, offset, limit)]
+        return self._slice(self.names, descending, offset, limit)
+
+    def _slice(self, seq, descending, offset, limit):
+        if not descending:
+            return seq[offset:offset + limit]
+        end = max(len(seq) - offset, 0)
+        return seq[max(end - limit, 0):end][::-1]
+
+    def top(self, n=10):
+        return [name for _, name in self._slice(self.by_balance, True, 0, n)]
+
+    def search(self, prefix, limit=20):
+        i = bisect_left(self.names, prefix)
+        matches = []
+        while i < len(self.names) and len(matches) < limit and self.names[i].startswith(prefix):
+            matches.append(self.names[i])
+            i += 1
+        return matches
+
+
+account_index = AccountIndex(accounts)
+# Held while a balance and its account_index entry change together. It is
+# the ledger's write lock, so handlers can change balances and record the
+# transaction as one step, and exports can read both from the same moment.
+balance_lock = ledger.lock
+
+
+def open_account(name):
+    with balance_lock:
+        if name in accounts:
+            return False
+        accounts[name] = 0
+        account_index.add(name, 0)
+        ledger.create(name)
+        return True
+
+def adjust_balance(acc, delta):
+    with balance_lock:
+        old = accounts[acc]
+        accounts[acc] = old + delta
+        account_index.update(acc, old, old + delta)
+
+def export_state():
+    """Return (balances, snapshot) as of a single point between writes."""
+    with balance_lock:
+        return dict(accounts), ledger.snapshot()
+
+def month_spent(index, acc, category, day=None):
+    first, last = month_bounds(day or datetime.utcnow().date())
+    return index.total(acc, category, first, last, flow="expense")
+
+def over_budget(acc, category, amount, replacing=None):
+    """``replacing`` is an (account, tx) pair whose amount stops counting."""
+    limit = budgets.get(acc, {}).get(category)
+    if limit is None:
+        return False
+    today = datetime.utcnow().date()
+    spent = month_spent(ledger.snapshot().index, acc, category, today)
+    if replacing is not None:
+        old_acc, old_tx = replacing
+        day = tx_day(old_tx)
+        if (old_acc == acc and old_tx.get("category", "Other") == category
+                and tx_flow(old_tx) == "expense" and day and month_bounds(day) == month_bounds(today)):
+            spent -= int(old_tx.get("amount", 0))
+    return spent + amount > limit
+
+
+# Background jobs. Each job is split into parts that run in a process pool
+# (see job_workers.py) over chunks of a pinned snapshot; the request thread
+# only submits and returns.
+
+jobs = {}
+jobs_lock = threading.Lock()
+_job_executor = None
+_job_executor_lock = threading.Lock()
+
+
+def job_executor(broken=None):
+    """Return the shared pool, replacing ``broken`` if it is still the current one."""
+    global _job_executor
+    with _job_executor_lock:
+        if _job_executor is None or _job_executor is broken:
+            if broken is not None:
+                broken.shutdown(wait=False)
+            _job_executor = ProcessPoolExecutor()
+        return _job_executor
+
+def submit_job_part(fn, args):
+    executor = job_executor()
+    try:
+        return executor.submit(fn, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory), which poisons the whole
+        # pool; start a fresh one and retry once.
+        return job_executor(broken=executor).submit(fn, *args)
+
+def finish_report_job(job):
+    months = {}
+    categories = {}
+    for part in job["results"]:
+        for month, totals in part["months"].items():
+            merged = months.setdefault(month, {"income": 0, "expense": 0})
+            merged["income"] += totals["income"]
+            merged["expense"] += totals["expense"]
+        for cat, amount in part["categories"].items():
+            categories[cat] = categories.get(cat, 0) + amount
+    summary = [{"month": m, "income": months[m]["income"], "expense": months[m]["expense"],
+                "net": months[m]["income"] - months[m]["expense"]} for m in sorted(months)]
+    save_json(job["path"], {"params": job["params"], "months": summary, "categories": categories})
+
+def new_job(kind, params=None):
+    job_id = uuid.uuid4().hex
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    job = {
+        "id": job_id,
+        "kind": kind,
+        "params": params or {},
+        "status": "pending",
+        "parts": 0,
+        "done": 0,
+        "results": [],
+        "error": None,
+        "path": os.path.abspath(os.path.join(JOBS_DIR, f"{kind}-{job_id}.json")),
+        "expires": None,
+    }
+    with jobs_lock:
+        jobs[job_id] = job
+    return job
+
+def start_job(job, calls, finish=None):
+    job["parts"] = len(calls)
+    job["results"] = [None] * len(calls)
+    for i, (fn, args) in enumerate(calls):
+        try:
+            future = submit_job_part(fn, args)
+        except Exception as e:
+            with jobs_lock:
+                if job["status"] == "pending":
+                    _end_job(job, "failed", str(e))
+            return
+        future.add_done_callback(partial(_job_part_done, job, i, finish))
+
+def _job_part_done(job, i, finish, future):
+    with jobs_lock:
+        if job["status"] != "pending":
+            return
+        try:
+            job["results"][i] = future.result()
+            job["done"] += 1
+        except Exception as e:
+            _end_job(job, "failed", str(e))
+            return
+        if job["done"] < job["parts"]:
+            return
+    try:
+        if finish:
+            finish(job)
+    except Exception as e:
+        with jobs_lock:
+            _end_job(job, "failed", str(e))
+        return
+    with jobs_lock:
+        _end_job(job, "done")
+
+def _end_job(job, status, error=None):
+    job["status"] = status
+    job["error"] = error
+    job["results"] = []
+    job["expires"] = datetime.utcnow() + JOB_TTL
+
+def expire_jobs():
+    now = datetime.utcnow()
+    with jobs_lock:
+        for job_id in [j for j, job in jobs.items() if job["expires"] and job["expires"] < now]:
+            del jobs[job_id]
+    # Artifacts are removed by age so files left by an earlier process go too.
+    if os.path.isdir(JOBS_DIR):
+        cutoff = time.time() - JOB_TTL.total_seconds()
+        for name in os.listdir(JOBS_DIR):
+            path = os.path.join(JOBS_DIR, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+def wants_html():
+    return request.accept_mimetypes.best_match(["application/json", "text/html"]) == "text/html"
+
+def job_response(job):
+    """Send browsers to the job page; API clients get 202 and the status."""
+    location = url_for("get_job", job_id=job["id"])
+    if wants_html():
+        return redirect(location, 303)
+    code = 503 if job["status"] == "failed" else 202
+    return jsonify(job_status(job)), code, {"Location": location}
+
+def job_status(job):
+    status = {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": job["done"] / job["parts"] if job["parts"] else 0.0,
+        "error": job["error"],
+    }
+    if job["status"] == "done":
+        status["download"] = url_for("download_job", job_id=job["id"])
+        status["expires"] = job["expires"].isoformat()
+    return status
 
 
 def persist_transactions():
-    save_json(TRANSACTIONS_FILE, transactions)
+    save_json(TRANSACTIONS_FILE, ledger.snapshot().to_dict())
 
 def persist_accounts():
     save_json(ACCOUNTS_FILE, accounts)
 
+def persist_budgets():
+    save_json(BUDGETS_FILE, budgets)
+
 
 template_dict = {
+    "macros.html": """
+{% macro account_picker(name, value="", required=True, placeholder="Account") %}
+<input name="{{ name }}" value="{{ value }}" list="{{ name }}-options" placeholder="{{ placeholder }}" autocomplete="off" data-account-search {% if required %}required{% endif %}>
+<datalist id="{{ name }}-options"></datalist>
+{% endmacro %}
+""",
     "base.html": """
 <!doctype html>
 <html>
@@ -93,22 +920,20 @@ template_dict = {
   <meta charset="utf-8">
   <title>Byte Bank - Finance</title>
   <link rel="stylesheet" href="{{ url_for('static', filename='style.css') }}">
-  <style>
-    body{font-family:Arial,Helvetica,sans-serif;background:#f7f9fb;margin:0;padding:0}
-    .container{width:90%;max-width:1100px;margin:30px auto;background:#fff;padding:20px;border-radius:8px;box-shadow:0 6px 18px rgba(0,0,0,0.06)}
-    nav a{margin-right:10px;text-decoration:none;color:#1a73e8}
-    table{width:100%;border-collapse:collapse;margin-top:10px}
-    th,td{padding:8px;border:1px solid #e6e9ee;text-align:left}
-    th{background:#1a73e8;color:#fff}
-    .success{color:green}.error{color:red}
-    input,select,button{padding:6px;margin:6px 0}
-    .row{display:flex;gap:12px;flex-wrap:wrap}
-    .col{flex:1;min-width:160px}
-    .small{width:120px}
-  </style>
+  <link rel="stylesheet" href="{{ url_for('asset', name='base.css') }}">
 </head>
 <body>
   <div class="container">
+    {{ static_fragment("header.html") }}
+    {% block content %}{% endblock %}
+  </div>
+  <!-- Chart.js from CDN -->
+  <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+  <script src="{{ url_for('asset', name='app.js') }}" data-search-url="{{ url_for('search_accounts') }}"></script>
+</body>
+</html>
+""",
+    "header.html": """
     <h1>Byte Bank — Personal Finance</h1>
     <nav>
       <a href="{{ url_for('index') }}">Home</a> |
@@ -119,15 +944,10 @@ template_dict = {
       <a href="{{ url_for('expenses') }}">Expenses</a> |
       <a href="{{ url_for('list_accounts') }}">Accounts</a> |
       <a href="{{ url_for('reports') }}">Reports</a> |
+      <a href="{{ url_for('manage_budgets') }}">Budgets</a> |
       <a href="{{ url_for('export_json') }}">Export JSON</a>
     </nav>
     <hr>
-    {% block content %}{% endblock %}
-  </div>
-  <!-- Chart.js from CDN -->
-  <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-</body>
-</html>
 """,
     "index.html": """
 {% extends "base.html" %}
@@ -151,10 +971,15 @@ template_dict = {
 {% extends "base.html" %}
 {% block content %}
 <h2>Accounts</h2>
-{% if accounts %}
+{% if rows %}
+<p>
+  Sort by:
+  <a href="{{ url_for('list_accounts', sort='name', order='asc') }}">Name</a> |
+  <a href="{{ url_for('list_accounts', sort='balance', order='desc') }}">Balance</a>
+</p>
 <table>
   <tr><th>Name</th><th>Balance</th><th>Transactions</th></tr>
-  {% for name, balance in accounts.items() %}
+  {% for name, balance in rows %}
   <tr>
     <td>{{ name }}</td>
     <td>{{ balance }}</td>
@@ -162,6 +987,11 @@ template_dict = {
   </tr>
   {% endfor %}
 </table>
+<p>
+  {% if page > 1 %}<a href="{{ url_for('list_accounts', sort=sort, order=order, page=page-1, per_page=per_page) }}">&laquo; Prev</a>{% endif %}
+  Page {{ page }} of {{ pages }} ({{ total }} accounts)
+  {% if page < pages %}<a href="{{ url_for('list_accounts', sort=sort, order=order, page=page+1, per_page=per_page) }}">Next &raquo;</a>{% endif %}
+</p>
 {% else %}
 <p>No accounts yet.</p>
 {% endif %}
@@ -169,12 +999,11 @@ template_dict = {
 """,
     "deposit.html": """
 {% extends "base.html" %}
+{% from "macros.html" import account_picker %}
 {% block content %}
 <h2>Deposit</h2>
 <form method="post">
-  <select name="account" required>
-    {% for n in accounts %}<option value="{{ n }}">{{ n }}</option>{% endfor %}
-  </select>
+  {{ account_picker("account") }}
   <input name="amount" type="number" min="1" placeholder="Amount" required>
   <button type="submit">Deposit</button>
 </form>
@@ -183,12 +1012,11 @@ template_dict = {
 """,
     "withdraw.html": """
 {% extends "base.html" %}
+{% from "macros.html" import account_picker %}
 {% block content %}
 <h2>Withdraw</h2>
 <form method="post">
-  <select name="account" required>
-    {% for n in accounts %}<option value="{{ n }}">{{ n }}</option>{% endfor %}
-  </select>
+  {{ account_picker("account") }}
   <input name="amount" type="number" min="1" placeholder="Amount" required>
   <button type="submit">Withdraw</button>
 </form>
@@ -197,15 +1025,12 @@ template_dict = {
 """,
     "transfer.html": """
 {% extends "base.html" %}
+{% from "macros.html" import account_picker %}
 {% block content %}
 <h2>Transfer</h2>
 <form method="post">
-  <select name="from_account" required>
-    {% for n in accounts %}<option value="{{ n }}">{{ n }}</option>{% endfor %}
-  </select>
-  <select name="to_account" required>
-    {% for n in accounts %}<option value="{{ n }}">{{ n }}</option>{% endfor %}
-  </select>
+  {{ account_picker("from_account", placeholder="From account") }}
+  {{ account_picker("to_account", placeholder="To account") }}
   <input name="amount" type="number" min="1" placeholder="Amount" required>
   <button type="submit">Transfer</button>
 </form>
@@ -214,6 +1039,7 @@ template_dict = {
 """,
     "expenses.html": """
 {% extends "base.html" %}
+{% from "macros.html" import account_picker %}
 {% block content %}
 <h2>Expenses / Add / Filter / Manage</h2>
 
@@ -222,17 +1048,13 @@ template_dict = {
 <form method="post" action="{{ url_for('expenses') }}">
   <div class="row">
     <div class="col">
-      <select name="account" required>
-        {% for n in accounts %}<option value="{{ n }}">{{ n }}</option>{% endfor %}
-      </select>
+      {{ account_picker("account") }}
     </div>
     <div class="col">
       <input name="details" placeholder="Description (e.g. Rent)" required>
     </div>
     <div class="col">
-      <select name="category">
-        {% for c in categories %}<option value="{{ c }}">{{ c }}</option>{% endfor %}
-      </select>
+      <select name="category">{{ category_options() }}</select>
     </div>
     <div class="col small">
       <input name="amount" type="number" min="1" placeholder="Amount" required>
@@ -251,15 +1073,12 @@ template_dict = {
 <form method="get" action="{{ url_for('expenses') }}">
   <div class="row">
     <div class="col">
-      <select name="account_filter">
-        <option value="">All Accounts</option>
-        {% for n in accounts %}<option value="{{ n }}" {% if request.args.get('account_filter')==n %}selected{% endif %}>{{ n }}</option>{% endfor %}
-      </select>
+      {{ account_picker("account_filter", request.args.get('account_filter', ''), required=False, placeholder="All Accounts") }}
     </div>
     <div class="col">
       <select name="category_filter">
         <option value="">All Categories</option>
-        {% for c in categories %}<option value="{{ c }}" {% if request.args.get('category_filter')==c %}selected{% endif %}>{{ c }}</option>{% endfor %}
+        {{ category_options(request.args.get('category_filter', '')) }}
       </select>
     </div>
     <div class="col">
@@ -303,17 +1122,14 @@ template_dict = {
 """,
     "edit_expense.html": """
 {% extends "base.html" %}
+{% from "macros.html" import account_picker %}
 {% block content %}
 <h2>Edit Expense</h2>
 <form method="post">
   <div class="row">
     <div class="col">
       <label>Account</label>
-      <select name="account" required>
-        {% for n in accounts %}
-          <option value="{{ n }}" {% if n==tx.account %}selected{% endif %}>{{ n }}</option>
-        {% endfor %}
-      </select>
+      {{ account_picker("account", tx.account) }}
     </div>
     <div class="col">
       <label>Details</label>
@@ -321,11 +1137,7 @@ template_dict = {
     </div>
     <div class="col">
       <label>Category</label>
-      <select name="category">
-        {% for c in categories %}
-          <option value="{{ c }}" {% if c==tx.category %}selected{% endif %}>{{ c }}</option>
-        {% endfor %}
-      </select>
+      <select name="category">{{ category_options(tx.category) }}</select>
     </div>
     <div class="col small">
       <label>Amount</label>
@@ -361,9 +1173,66 @@ template_dict = {
 <p>No transactions yet.</p>
 {% endif %}
 {% endblock %}
+""",
+    "job.html": """
+{% extends "base.html" %}
+{% block content %}
+<h2>{{ job.kind|capitalize }} Job</h2>
+{% if job.status == "done" %}
+<p class="success">Finished. <a href="{{ job.download }}">Download the result</a> before {{ job.expires[:16].replace('T', ' ') }} UTC.</p>
+{% elif job.status == "failed" %}
+<p class="error">The job failed: {{ job.error }}</p>
+{% else %}
+<p>Running: {{ (job.progress * 100)|round|int }}% done. This page refreshes until the job finishes.</p>
+<script>setTimeout(function () { location.reload(); }, 2000);</script>
+{% endif %}
+{% endblock %}
+""",
+    "budgets.html": """
+{% extends "base.html" %}
+{% from "macros.html" import account_picker %}
+{% block content %}
+<h2>Monthly Budgets</h2>
+<form method="post">
+  <div class="row">
+    <div class="col">
+      {{ account_picker("account") }}
+    </div>
+    <div class="col">
+      <select name="category">{{ category_options() }}</select>
+    </div>
+    <div class="col small">
+      <input name="limit" type="number" min="0" placeholder="Limit" required>
+    </div>
+    <div class="col small">
+      <button type="submit">Set Budget</button>
+    </div>
+  </div>
+</form>
+{% if message %}<p class="{{ 'error' if error else 'success' }}">{{ message }}</p>{% endif %}
+
+<h3>This Month</h3>
+{% if rows %}
+<table>
+  <tr><th>Account</th><th>Category</th><th>Limit</th><th>Spent</th><th>Remaining</th></tr>
+  {% for r in rows %}
+  <tr>
+    <td>{{ r.account }}</td>
+    <td>{{ r.category }}</td>
+    <td>{{ r.limit }}</td>
+    <td>{{ r.spent }}</td>
+    <td class="{{ 'error' if r.remaining < 0 }}">{{ r.remaining }}</td>
+  </tr>
+  {% endfor %}
+</table>
+{% else %}
+<p>No budgets set.</p>
+{% endif %}
+{% endblock %}
 """,
     "reports.html": """
 {% extends "base.html" %}
+{% from "macros.html" import account_picker %}
 {% block content %}
 <h2>Reports</h2>
 
@@ -374,8 +1243,73 @@ template_dict = {
 <canvas id="pieChart" width="400" height="300"></canvas>
 
 <hr>
-<h3>Summary Table (last 12 months)</h3>
+<h3>Custom Range</h3>
+<form method="get" action="{{ url_for('reports') }}">
+  <div class="row">
+    <div class="col">
+      <input type="date" name="date_from" value="{{ request.args.get('date_from','') }}">
+    </div>
+    <div class="col">
+      <input type="date" name="date_to" value="{{ request.args.get('date_to','') }}">
+    </div>
+    <div class="col small">
+      <button type="submit">Apply</button>
+    </div>
+  </div>
+</form>
+{% if range_totals %}
+<table>
+  <tr><th>Income</th><th>Expense</th><th>Net</th></tr>
+  <tr>
+    <td>{{ range_totals.income }}</td>
+    <td>{{ range_totals.expense }}</td>
+    <td>{{ range_totals.income - range_totals.expense }}</td>
+  </tr>
+</table>
 <table>
+  <tr><th>Category</th><th>Expense</th></tr>
+  {% for cat, val in range_totals.categories.items() if val %}
+  <tr><td>{{ cat }}</td><td>{{ val }}</td></tr>
+  {% endfor %}
+</table>
+{% endif %}
+
+<hr>
+<h3>Full Report</h3>
+<p>Monthly totals for every transaction in the range, built in the background.</p>
+<form method="post" action="{{ url_for('report_job') }}">
+  <div class="row">
+    <div class="col">
+      <input type="date" name="date_from" value="{{ request.args.get('date_from','') }}">
+    </div>
+    <div class="col">
+      <input type="date" name="date_to" value="{{ request.args.get('date_to','') }}">
+    </div>
+    <div class="col small">
+      <button type="submit">Run Report</button>
+    </div>
+  </div>
+</form>
+
+<hr>
+<h3>Balance Over Time</h3>
+<form method="get" action="{{ url_for('reports') }}">
+  <div class="row">
+    <div class="col">
+      {{ account_picker("account", request.args.get('account', '')) }}
+    </div>
+    <div class="col small">
+      <button type="submit">Show</button>
+    </div>
+  </div>
+</form>
+{% if balance_series %}
+<canvas id="balanceChart" width="800" height="300"></canvas>
+{% endif %}
+
+<hr>
+<h3>Summary Table (last 12 months)</h3>
+<table id="summaryTable">
   <tr><th>Month</th><th>Income</th><th>Expense</th><th>Net</th></tr>
   {% for row in summary_table %}
     <tr>
@@ -388,38 +1322,70 @@ template_dict = {
 </table>
 
 <script>
-  // Bar chart
-  const ctx = document.getElementById('barChart').getContext('2d');
-  const labels = {{ labels | safe }};
-  const incomeData = {{ income_data | safe }};
-  const expenseData = {{ expense_data | safe }};
-  new Chart(ctx, {
-    type: 'bar',
-    data: {
-      labels: labels,
-      datasets: [
-        { label: 'Income', data: incomeData, backgroundColor: 'rgba(0,123,255,0.6)' },
-        { label: 'Expense', data: expenseData, backgroundColor: 'rgba(220,53,69,0.6)' }
-      ]
-    },
-    options: {
-      responsive: true,
-      scales: { y: { beginAtZero: true } }
-    }
-  });
-
-  // Pie chart
-  const pctx = document.getElementById('pieChart').getContext('2d');
-  const catLabels = {{ cat_labels | safe }};
-  const catValues = {{ cat_values | safe }};
-  new Chart(pctx, {
-    type: 'pie',
+  function drawCharts(data) {
+    // Bar chart
+    const ctx = document.getElementById('barChart').getContext('2d');
+    new Chart(ctx, {
+      type: 'bar',
+      data: {
+        labels: data.labels,
+        datasets: [
+          { label: 'Income', data: data.income, backgroundColor: 'rgba(0,123,255,0.6)' },
+          { label: 'Expense', data: data.expense, backgroundColor: 'rgba(220,53,69,0.6)' }
+        ]
+      },
+      options: {
+        responsive: true,
+        scales: { y: { beginAtZero: true } }
+      }
+    });
+
+    // Pie chart
+    const pctx = document.getElementById('pieChart').getContext('2d');
+    new Chart(pctx, {
+      type: 'pie',
+      data: {
+        labels: data.cat_labels,
+        datasets: [{ data: data.cat_values }]
+      },
+      options: { responsive: true }
+    });
+  }
+
+  function fillSummary(data) {
+    const table = document.getElementById('summaryTable');
+    data.labels.forEach(function (month, i) {
+      const row = table.insertRow();
+      [month, data.income[i], data.expense[i], data.income[i] - data.expense[i]].forEach(function (value) {
+        row.insertCell().textContent = value;
+      });
+    });
+  }
+
+  {% if chart_data %}
+  drawCharts({{ chart_data | safe }});
+  {% else %}
+  fetch("{{ url_for('report_data') }}")
+    .then(function (r) { return r.json(); })
+    .then(function (data) {
+      drawCharts(data);
+      fillSummary(data);
+    });
+  {% endif %}
+
+  {% if balance_series %}
+  // Balance line chart
+  const bctx = document.getElementById('balanceChart').getContext('2d');
+  const balanceSeries = {{ balance_series | safe }};
+  new Chart(bctx, {
+    type: 'line',
     data: {
-      labels: catLabels,
-      datasets: [{ data: catValues }]
+      labels: balanceSeries.map(function (p) { return p[0]; }),
+      datasets: [{ label: 'Balance', data: balanceSeries.map(function (p) { return p[1]; }), borderColor: 'rgba(0,123,255,0.8)' }]
     },
     options: { responsive: true }
   });
+  {% endif %}
 </script>
 {% endblock %}
 """
@@ -428,6 +1394,107 @@ template_dict = {
 app.jinja_loader = DictLoader(template_dict)
 
 
+# Layout CSS and script are served once with long-lived cache headers
+# instead of being inlined into every page.
+ASSETS = {
+    "base.css": ("text/css", """
+body{font-family:Arial,Helvetica,sans-serif;background:#f7f9fb;margin:0;padding:0}
+.container{width:90%;max-width:1100px;margin:30px auto;background:#fff;padding:20px;border-radius:8px;box-shadow:0 6px 18px rgba(0,0,0,0.06)}
+nav a{margin-right:10px;text-decoration:none;color:#1a73e8}
+table{width:100%;border-collapse:collapse;margin-top:10px}
+th,td{padding:8px;border:1px solid #e6e9ee;text-align:left}
+th{background:#1a73e8;color:#fff}
+.success{color:green}.error{color:red}
+input,select,button{padding:6px;margin:6px 0}
+.row{display:flex;gap:12px;flex-wrap:wrap}
+.col{flex:1;min-width:160px}
+.small{width:120px}
+"""),
+    "app.js": ("application/javascript", """
+// Type-ahead account pickers: ask the server for a few prefix matches
+// instead of rendering every account into a <select>.
+const searchUrl = document.currentScript.dataset.searchUrl;
+document.querySelectorAll('input[data-account-search]').forEach(function (input) {
+  const list = document.getElementById(input.getAttribute('list'));
+  let pending;
+  input.addEventListener('input', function () {
+    clearTimeout(pending);
+    pending = setTimeout(function () {
+      fetch(searchUrl + "?q=" + encodeURIComponent(input.value))
+        .then(function (r) { return r.json(); })
+        .then(function (data) {
+          list.replaceChildren(...data.accounts.map(function (a) {
+            const opt = document.createElement('option');
+            opt.value = a.name;
+            opt.label = a.name + ' (' + a.balance + ')';
+            return opt;
+          }));
+        });
+    }, 150);
+  });
+});
+"""),
+}
+ASSET_ETAGS = {name: hashlib.md5(body.encode()).hexdigest() for name, (_, body) in ASSETS.items()}
+
+CATEGORY_OPTIONS = {
+    selected: Markup("".join(
+        f'<option value="{escape(c)}"{" selected" if c == selected else ""}>{escape(c)}</option>'
+        for c in CATEGORIES))
+    for selected in [""] + CATEGORIES
+}
+
+_fragments = {}
+# Distinguishes ETags issued by this process, since ledger versions restart at 0.
+ETAG_SEED = uuid.uuid4().hex[:8]
+
+
+def category_options(selected=""):
+    return CATEGORY_OPTIONS.get(selected, CATEGORY_OPTIONS[""])
+
+def static_fragment(name):
+    """Render a template with no per-request content once and reuse it."""
+    if name not in _fragments:
+        _fragments[name] = Markup(render_template(name))
+    return _fragments[name]
+
+app.jinja_env.globals.update(category_options=category_options, static_fragment=static_fragment)
+
+
+def negotiate_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted.quality("br") > 0:
+        return "br"
+    if accepted.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+@app.after_request
+def compress_response(response):
+    if (response.direct_passthrough or response.status_code != 200
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+    if encoding == "br":
+        response.set_data(brotli.compress(data, quality=5))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers["Content-Encoding"] = encoding
+    # The compressed body is a different representation, so a strong ETag
+    # shared with the identity response would be wrong.
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -441,12 +1508,10 @@ def create_account():
         if not name:
             message = "Name required."
             error = True
-        elif name in accounts:
+        elif not open_account(name):
             message = "Account already exists."
             error = True
         else:
-            accounts[name] = 0
-            transactions[name] = []
             persist_accounts()
             persist_transactions()
             message = f"Account '{name}' created."
@@ -454,7 +1519,38 @@ def create_account():
 
 @app.route("/accounts")
 def list_accounts():
-    return render_template("list_accounts.html", accounts=accounts)
+    sort = request.args.get("sort", "name")
+    order = request.args.get("order", "asc")
+    try:
+        page = max(int(request.args.get("page", 1)), 1)
+        per_page = min(max(int(request.args.get("per_page", 50)), 1), 200)
+    except ValueError:
+        page, per_page = 1, 50
+    total = len(account_index)
+    pages = max((total + per_page - 1) // per_page, 1)
+    page = min(page, pages)
+    names = account_index.page(sort, order == "desc", (page - 1) * per_page, per_page)
+    rows = [(name, accounts[name]) for name in names]
+    return render_template("list_accounts.html", rows=rows, sort=sort, order=order,
+                           page=page, pages=pages, per_page=per_page, total=total)
+
+@app.route("/accounts/search")
+def search_accounts():
+    try:
+        limit = min(max(int(request.args.get("limit", 20)), 1), 50)
+    except ValueError:
+        limit = 20
+    names = account_index.search(request.args.get("q", "").strip(), limit)
+    return jsonify({"accounts": [{"name": n, "balance": accounts[n]} for n in names]})
+
+@app.route("/accounts/top")
+def top_accounts():
+    try:
+        n = min(max(int(request.args.get("n", 10)), 1), 100)
+    except ValueError:
+        n = 10
+    names = account_index.top(n)
+    return jsonify({"accounts": [{"name": name, "balance": accounts[name]} for name in names]})
 
 @app.route("/deposit", methods=["GET", "POST"])
 def deposit():
@@ -470,14 +1566,14 @@ def deposit():
             message = "Invalid account."
             error = True
         else:
-            accounts[acc] += amount
-            persist_accounts()
-            
             t = Transaction("Deposit", amount, details="Deposit", category="Salary" if amount>0 else "Other")
-            transactions.setdefault(acc, []).append(t.to_dict())
+            with balance_lock:
+                adjust_balance(acc, amount)
+                ledger.append(acc, t.to_dict())
+            persist_accounts()
             persist_transactions()
             message = f"Deposited {amount} bytes to {acc}."
-    return render_template("deposit.html", accounts=accounts, message=message, error=error)
+    return render_template("deposit.html", message=message, error=error)
 
 @app.route("/withdraw", methods=["GET", "POST"])
 def withdraw():
@@ -496,13 +1592,14 @@ def withdraw():
             message = "Insufficient funds."
             error = True
         else:
-            accounts[acc] -= amount
-            persist_accounts()
             t = Transaction("Withdraw", amount, details="Withdraw", category="Other")
-            transactions.setdefault(acc, []).append(t.to_dict())
+            with balance_lock:
+                adjust_balance(acc, -amount)
+                ledger.append(acc, t.to_dict())
+            persist_accounts()
             persist_transactions()
             message = f"Withdrew {amount} bytes from {acc}."
-    return render_template("withdraw.html", accounts=accounts, message=message, error=error)
+    return render_template("withdraw.html", message=message, error=error)
 
 @app.route("/transfer", methods=["GET", "POST"])
 def transfer():
@@ -525,14 +1622,15 @@ def transfer():
             message = "Insufficient balance."
             error = True
         else:
-            accounts[from_acc] -= amount
-            accounts[to_acc] += amount
+            with balance_lock:
+                adjust_balance(from_acc, -amount)
+                adjust_balance(to_acc, amount)
+                ledger.append(from_acc, Transaction("Transfer Out", amount, details=f"To {to_acc}", category="Other").to_dict())
+                ledger.append(to_acc, Transaction("Transfer In", amount, details=f"From {from_acc}", category="Other").to_dict())
             persist_accounts()
-            transactions.setdefault(from_acc, []).append(Transaction("Transfer Out", amount, details=f"To {to_acc}", category="Other").to_dict())
-            transactions.setdefault(to_acc, []).append(Transaction("Transfer In", amount, details=f"From {from_acc}", category="Other").to_dict())
             persist_transactions()
             message = f"Transferred {amount} bytes from {from_acc} to {to_acc}."
-    return render_template("transfer.html", accounts=accounts, message=message, error=error)
+    return render_template("transfer.html", message=message, error=error)
 
 
 @app.route("/expenses", methods=["GET", "POST"])
@@ -559,11 +1657,15 @@ def expenses():
         elif accounts[acc] < amount:
             message = "Insufficient balance for this expense."
             error = True
+        elif over_budget(acc, category, amount):
+            message = f"Monthly {category} budget for {acc} would be exceeded."
+            error = True
         else:
-            accounts[acc] -= amount
-            persist_accounts()
             t = Transaction("Expense", amount, details=details, category=category)
-            transactions.setdefault(acc, []).append(t.to_dict())
+            with balance_lock:
+                adjust_balance(acc, -amount)
+                ledger.append(acc, t.to_dict())
+            persist_accounts()
             persist_transactions()
             message = f"Expense '{details}' of {amount} recorded for {acc}."
 
@@ -575,7 +1677,7 @@ def expenses():
 
     
     all_tx = []
-    for acc, tlist in transactions.items():
+    for acc, tlist in ledger.snapshot().items():
         for t in tlist:
             tx = dict(t)  
             tx.setdefault("account", acc)
@@ -608,8 +1710,6 @@ def expenses():
         filtered = filtered[:200]
 
     return render_template("expenses.html",
-                           accounts=accounts,
-                           categories=CATEGORIES,
                            filtered=filtered,
                            message=message,
                            error=error,
@@ -618,10 +1718,10 @@ def expenses():
 
 @app.route("/expenses/edit/<account>/<txid>", methods=["GET", "POST"])
 def edit_expense(account, txid):
-    if account not in transactions:
+    if account not in ledger:
         return "Account not found", 404
 
-    tx = next((t for t in transactions[account] if t.get("id") == txid), None)
+    tx = ledger.find(account, txid)
     if not tx:
         return "Transaction not found", 404
 
@@ -649,43 +1749,41 @@ def edit_expense(account, txid):
             error = True
         else:
             
-            
-            accounts[prev_account] += prev_amount
-            
-            if accounts[new_account] < new_amount:
-                
-                accounts[prev_account] -= prev_amount
+            available = accounts[new_account] + (prev_amount if new_account == prev_account else 0)
+            if available < new_amount:
                 message = "Insufficient balance in the selected account for updated amount."
                 error = True
+            elif over_budget(new_account, new_category, new_amount, replacing=(prev_account, tx)):
+                message = f"Monthly {new_category} budget for {new_account} would be exceeded."
+                error = True
             else:
-                accounts[new_account] -= new_amount
-                persist_accounts()
-
-                
-                tx.update({
+                updated = dict(tx)
+                updated.update({
                     "amount": new_amount,
                     "details": new_details,
                     "category": new_category,
                     "date": datetime.utcnow().isoformat()
                 })
-            
-                if new_account != prev_account:
-                    
-                    transactions[prev_account] = [t for t in transactions[prev_account] if t.get("id") != txid]
-                    transactions.setdefault(new_account, []).append(tx)
+                with balance_lock:
+                    if not ledger.replace(prev_account, tx, new_account, updated):
+                        return "Transaction not found", 404
+                    adjust_balance(prev_account, prev_amount)
+                    adjust_balance(new_account, -new_amount)
+                persist_accounts()
+                tx = updated
                 persist_transactions()
                 message = "Expense updated."
     
     tx_for_template = dict(tx)
     tx_for_template["account"] = account
-    return render_template("edit_expense.html", accounts=accounts, categories=CATEGORIES, tx=tx_for_template, message=message, error=error)
+    return render_template("edit_expense.html", tx=tx_for_template, message=message, error=error)
 
 
 @app.route("/expenses/delete/<account>/<txid>", methods=["POST"])
 def delete_expense(account, txid):
-    if account not in transactions:
+    if account not in ledger:
         return "Account not found", 404
-    tx = next((t for t in transactions[account] if t.get("id") == txid), None)
+    tx = ledger.find(account, txid)
     if not tx:
         return "Transaction not found", 404
     
@@ -694,25 +1792,29 @@ def delete_expense(account, txid):
     except:
         amount = 0
 
-    if tx.get("type") in ["Expense", "Withdraw", "Transfer Out"]:
-        accounts.setdefault(account, 0)
-        accounts[account] += amount
+    with balance_lock:
+        if not ledger.remove(account, tx):
+            return "Transaction not found", 404
+        if tx.get("type") in EXPENSE_TYPES:
+            open_account(account)
+            adjust_balance(account, amount)
+    if tx.get("type") in EXPENSE_TYPES:
         persist_accounts()
     
-    transactions[account] = [t for t in transactions[account] if t.get("id") != txid]
     persist_transactions()
     return redirect(url_for('expenses'))
 
 @app.route("/transactions/<account>")
 def view_transactions(account):
-    if account not in transactions:
+    snapshot = ledger.snapshot()
+    if account not in snapshot:
         return "Account not found", 404
-    txs = sorted(transactions.get(account, []), key=lambda x: x.get("date",""), reverse=True)
+    txs = sorted(snapshot.get(account), key=lambda x: x.get("date",""), reverse=True)
     return render_template("transactions.html", account=account, txs=txs)
 
 
-@app.route("/reports")
-def reports():
+def report_chart_data(snapshot):
+    index = snapshot.index
     
     now = datetime.utcnow()
     months = []
@@ -721,35 +1823,18 @@ def reports():
         months.append(m.strftime("%Y-%m"))
 
     
-    income_by_month = {m: 0 for m in months}
-    expense_by_month = {m: 0 for m in months}
+    income_by_month = {}
+    expense_by_month = {}
     category_totals = {c: 0 for c in CATEGORIES}
-    category_totals["Other"] = category_totals.get("Other", 0)
+    category_totals.update({c: 0 for c in index.categories()})
 
     
-    income_types = {"Deposit", "Transfer In"}
-    expense_types = {"Expense", "Withdraw", "Transfer Out"}
-
-    
-    for acc, tlist in transactions.items():
-        for t in tlist:
-            try:
-                tdate = t.get("date","")
-                month = tdate[:7]  # YYYY-MM
-                amt = int(t.get("amount", 0))
-                ttype = t.get("type","")
-                cat = t.get("category","Other")
-            except:
-                continue
-            if month in months:
-                if ttype in income_types:
-                    income_by_month[month] += amt
-                elif ttype in expense_types:
-                    expense_by_month[month] += amt
-                
-                if ttype in expense_types:
-                    category_totals.setdefault(cat, 0)
-                    category_totals[cat] += amt
+    for m in dict.fromkeys(months):
+        first, last = month_bounds(date.fromisoformat(m + "-01"))
+        income_by_month[m] = index.total(None, None, first, last, flow="income")
+        expense_by_month[m] = index.total(None, None, first, last, flow="expense")
+        for cat in category_totals:
+            category_totals[cat] += index.total(None, cat, first, last, flow="expense")
 
     labels = months
     income_data = [income_by_month[m] for m in months]
@@ -763,30 +1848,208 @@ def reports():
             cat_labels.append(cat)
             cat_values.append(val)
 
+    return {"labels": labels, "income": income_data, "expense": expense_data,
+            "cat_labels": cat_labels, "cat_values": cat_values}
+
+
+@app.route("/reports")
+def reports():
+    snapshot = ledger.snapshot()
+    inline = request.args.get("charts", "inline" if INLINE_CHART_DATA else "fetch") == "inline"
 
+    # When charts are fetched, /reports/data also fills the summary table.
+    data = None
     summary_table = []
-    for m in months:
-        inc = income_by_month[m]
-        exp = expense_by_month[m]
-        summary_table.append({"month": m, "income": inc, "expense": exp, "net": inc - exp})
+    if inline:
+        data = report_chart_data(snapshot)
+        for m, inc, exp in zip(data["labels"], data["income"], data["expense"]):
+            summary_table.append({"month": m, "income": inc, "expense": exp, "net": inc - exp})
+
+    
+    range_totals = None
+    try:
+        range_from = parse_day(request.args.get("date_from", ""))
+        range_to = parse_day(request.args.get("date_to", ""))
+    except ValueError:
+        range_from = range_to = None
+    if range_from or range_to:
+        range_totals = {
+            "income": snapshot.index.total(None, None, range_from, range_to, flow="income"),
+            "expense": snapshot.index.total(None, None, range_from, range_to, flow="expense"),
+            "categories": {cat: snapshot.index.total(None, cat, range_from, range_to, flow="expense")
+                           for cat in dict.fromkeys(CATEGORIES + sorted(snapshot.index.categories()))},
+        }
+
+    balance_series = None
+    account = request.args.get("account", "")
+    if account in snapshot.timelines:
+        balance_series = json.dumps(snapshot.timelines[account].series())
 
     return render_template("reports.html",
-                           labels=json.dumps(labels),
-                           income_data=json.dumps(income_data),
-                           expense_data=json.dumps(expense_data),
-                           cat_labels=json.dumps(cat_labels),
-                           cat_values=json.dumps(cat_values),
-                           summary_table=summary_table)
+                           chart_data=json.dumps(data) if inline else None,
+                           summary_table=summary_table,
+                           range_totals=range_totals,
+                           balance_series=balance_series,
+                           request=request)
+
+@app.route("/reports/data")
+def report_data():
+    # The ledger version changes on every write, so it doubles as a validator.
+    snapshot = ledger.snapshot()
+    etag = f"{ETAG_SEED}-{snapshot.version}-{datetime.utcnow():%Y-%m}"
+    if request.if_none_match.contains_weak(etag):
+        response = make_response("", 304)
+    else:
+        response = jsonify(report_chart_data(snapshot))
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+@app.route("/assets/<name>")
+def asset(name):
+    if name not in ASSETS:
+        return "Not found", 404
+    mimetype, body = ASSETS[name]
+    response = make_response(body)
+    response.mimetype = mimetype
+    response.set_etag(ASSET_ETAGS[name])
+    response.headers["Cache-Control"] = "public, max-age=86400"
+    return response.make_conditional(request)
+
+@app.route("/totals")
+def totals():
+    try:
+        start = parse_day(request.args.get("date_from", ""))
+        end = parse_day(request.args.get("date_to", ""))
+    except ValueError:
+        return jsonify({"error": "Dates must be YYYY-MM-DD."}), 400
+    if start and end and start > end:
+        return jsonify({"error": "date_from must not be after date_to."}), 400
+    account = request.args.get("account") or None
+    category = request.args.get("category") or None
+    flow = request.args.get("flow", "expense")
+    if account is not None and account not in accounts:
+        return jsonify({"error": "Account not found."}), 404
+    if flow not in ("income", "expense"):
+        return jsonify({"error": "Flow must be income or expense."}), 400
+    return jsonify({
+        "account": account,
+        "category": category,
+        "flow": flow,
+        "date_from": start.isoformat() if start else None,
+        "date_to": end.isoformat() if end else None,
+        "total": ledger.snapshot().index.total(account, category, start, end, flow=flow),
+    })
+
+
+@app.route("/balance/<account>")
+def balance_history(account):
+    if account not in accounts:
+        return jsonify({"error": "Account not found."}), 404
+    try:
+        at = parse_day(request.args.get("at", ""))
+    except ValueError:
+        return jsonify({"error": "Dates must be YYYY-MM-DD."}), 400
+    if at:
+        balance = ledger.snapshot().timelines.get(account, BalanceTimeline()).balance_at(at)
+    else:
+        # The timeline only sees dated income and expense entries; the account
+        # balance is what every other page shows.
+        balance = accounts[account]
+    return jsonify({"account": account, "at": at.isoformat() if at else None, "balance": balance})
+
+@app.route("/balance/<account>/series")
+def balance_series(account):
+    if account not in accounts:
+        return jsonify({"error": "Account not found."}), 404
+    try:
+        points = min(max(int(request.args.get("points", 60)), 2), 500)
+    except ValueError:
+        points = 60
+    timeline = ledger.snapshot().timelines.get(account, BalanceTimeline())
+    return jsonify({"account": account, "series": timeline.series(points)})
+
+
+@app.route("/budgets", methods=["GET", "POST"])
+def manage_budgets():
+    message = ""
+    error = False
+    if request.method == "POST":
+        acc = request.form.get("account")
+        category = request.form.get("category", "Other")
+        try:
+            limit = int(request.form.get("limit", ""))
+        except:
+            limit = -1
+        if acc not in accounts:
+            message = "Invalid account."
+            error = True
+        elif category not in CATEGORIES:
+            message = "Invalid category."
+            error = True
+        elif limit < 0:
+            message = "Enter a valid monthly limit."
+            error = True
+        else:
+            budgets.setdefault(acc, {})[category] = limit
+            persist_budgets()
+            message = f"Monthly {category} budget for {acc} set to {limit}."
+
+    snapshot = ledger.snapshot()
+    rows = []
+    for acc, limits in list(budgets.items()):
+        for category, limit in list(limits.items()):
+            spent = month_spent(snapshot.index, acc, category)
+            rows.append({"account": acc, "category": category, "limit": limit,
+                         "spent": spent, "remaining": limit - spent})
+    return render_template("budgets.html", rows=rows, message=message, error=error)
 
 @app.route("/export_json")
 def export_json():
-    export_file = "bank_export.json"
-    data = {
-        "accounts": accounts,
-        "transactions": transactions
-    }
-    save_json(export_file, data)
-    return send_file(export_file, as_attachment=True)
+    # The export is written by the job pool; the job page links the file.
+    return export_job()
+
+@app.route("/jobs/export", methods=["POST"])
+def export_job():
+    expire_jobs()
+    job = new_job("export")
+    balances, snapshot = export_state()
+    start_job(job, [(run_export_part, (job["path"], balances, snapshot.partition()[0]))])
+    return job_response(job)
+
+@app.route("/jobs/report", methods=["POST"])
+def report_job():
+    try:
+        start = parse_day(request.values.get("date_from", ""))
+        end = parse_day(request.values.get("date_to", ""))
+    except ValueError:
+        return jsonify({"error": "Dates must be YYYY-MM-DD."}), 400
+    expire_jobs()
+    params = {"date_from": start.isoformat() if start else None,
+              "date_to": end.isoformat() if end else None}
+    job = new_job("report", params)
+    parts = ledger.snapshot().partition(REPORT_BATCH_ACCOUNTS)
+    flows = {**dict.fromkeys(INCOME_TYPES, "income"), **dict.fromkeys(EXPENSE_TYPES, "expense")}
+    start_job(job, [(run_report_part, (part, params["date_from"], params["date_to"], flows)) for part in parts],
+              finish=finish_report_job)
+    return job_response(job)
+
+@app.route("/jobs/<job_id>")
+def get_job(job_id):
+    expire_jobs()
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found."}), 404
+    if wants_html():
+        return render_template("job.html", job=job_status(job))
+    return jsonify(job_status(job))
+
+@app.route("/jobs/<job_id>/download")
+def download_job(job_id):
+    job = jobs.get(job_id)
+    if not job or job["status"] != "done" or not os.path.exists(job["path"]):
+        return "Job result not available", 404
+    return send_file(job["path"], as_attachment=True, download_name=f"bank_{job['kind']}.json")
 
 if __name__ == "__main__":
     app.run(debug=True)
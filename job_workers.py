@@ -0,0 +1,41 @@
+"""Job parts run by the process pool.
+
+Workers started with spawn or forkserver import this module afresh, so it
+must stay free of import-time side effects. Importing app.py would reload
+the JSON files and rebuild every ledger index in each worker. Parts take
+plain data, {account: chunks} dicts of transaction tuples, never app objects.
+"""
+import json
+
+
+def transactions(chunk_map):
+    for acc, chunks in chunk_map.items():
+        yield acc, [t for chunk in chunks for t in chunk]
+
+def run_export_part(path, balances, chunk_map):
+    with open(path, "w") as f:
+        json.dump({"accounts": balances, "transactions": dict(transactions(chunk_map))},
+                  f, indent=4, default=str)
+
+def run_report_part(chunk_map, start, end, flows):
+    """``flows`` maps a transaction type to "income" or "expense"."""
+    months = {}
+    categories = {}
+    for acc, tlist in transactions(chunk_map):
+        for t in tlist:
+            day = t.get("date", "")[:10]
+            if (start and day < start) or (end and day > end):
+                continue
+            flow = flows.get(t.get("type"))
+            if flow is None:
+                continue
+            try:
+                amount = int(t.get("amount", 0))
+            except (TypeError, ValueError):
+                continue
+            totals = months.setdefault(day[:7], {"income": 0, "expense": 0})
+            totals[flow] += amount
+            if flow == "expense":
+                cat = t.get("category", "Other")
+                categories[cat] = categories.get(cat, 0) + amount
+    return {"months": months, "categories": categories}
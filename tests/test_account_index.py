@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+import app
+
+
+def random_balances(rng, n):
+    # Few distinct balances so ties are broken by name.
+    return {f"acc{rng.randint(0, 10 * n):05d}": rng.randint(-5, 5) for _ in range(n)}
+
+
+def oracle(balances, sort, descending):
+    if sort == "balance":
+        return [name for _, name in sorted(((b, n) for n, b in balances.items()), reverse=descending)]
+    return sorted(balances, reverse=descending)
+
+
+def test_page_matches_sorted_oracle():
+    rng = random.Random(27)
+    balances = random_balances(rng, 60)
+    index = app.AccountIndex(balances)
+    n = len(balances)
+    for sort in ("name", "balance"):
+        for descending in (False, True):
+            expected = oracle(balances, sort, descending)
+            # Offsets and limits on and past both ends of the list.
+            for offset in (0, 1, n - 1, n, n + 5):
+                for limit in (1, 7, n, n + 3):
+                    assert index.page(sort, descending, offset, limit) == expected[offset:offset + limit]
+
+
+def test_top_and_search_match_sorted_oracle():
+    rng = random.Random(270)
+    balances = random_balances(rng, 200)
+    index = app.AccountIndex(balances)
+    for n in (0, 1, 10, len(balances) + 1):
+        assert index.top(n) == oracle(balances, "balance", True)[:n]
+    names = sorted(balances)
+    for prefix in ["", "acc", "acc0", "acc00", "acc9", "b", "ac", names[0], names[-1] + "x"]:
+        for limit in (1, 5, 1000):
+            assert index.search(prefix, limit) == [n for n in names if n.startswith(prefix)][:limit]
+
+
+def test_update_keeps_balance_order_under_repeated_changes():
+    rng = random.Random(2700)
+    balances = random_balances(rng, 40)
+    index = app.AccountIndex(balances)
+    for step in range(2000):
+        if rng.random() < 0.05:
+            name = f"new{step}"
+            balances[name] = 0
+            index.add(name, 0)
+        else:
+            name = rng.choice(list(balances))
+            new = balances[name] + rng.randint(-3, 3)
+            index.update(name, balances[name], new)
+            balances[name] = new
+        if step % 50 == 0:
+            assert index.page("balance", False, 0, len(balances)) == oracle(balances, "balance", False)
+    assert index.names == sorted(balances)
+    assert len(index) == len(balances)
+
+
+def test_update_rejects_unindexed_account():
+    index = app.AccountIndex({"a": 5})
+    with pytest.raises(KeyError):
+        index.update("a", 4, 10)
+    with pytest.raises(KeyError):
+        index.update("b", 0, 1)
+    assert index.by_balance == [(5, "a")]
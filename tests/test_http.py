@@ -0,0 +1,75 @@
+import gzip
+import uuid
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Handlers persist to JSON files in the working directory.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, "brotli", None)
+    return app.app.test_client()
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get("/accounts/search?q=" + uuid.uuid4().hex, headers={"Accept-Encoding": "gzip"})
+    assert len(response.get_data()) < app.COMPRESS_MIN_SIZE
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.vary
+
+
+def test_gzip_follows_accept_encoding(client):
+    identity = client.get("/assets/app.js")
+    assert len(identity.get_data()) >= app.COMPRESS_MIN_SIZE
+    assert "Content-Encoding" not in identity.headers
+    assert "Accept-Encoding" in identity.vary
+
+    compressed = client.get("/assets/app.js", headers={"Accept-Encoding": "br, gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.vary
+    assert gzip.decompress(compressed.get_data()) == identity.get_data()
+
+    for refused in ("gzip;q=0", "br", "identity"):
+        response = client.get("/assets/app.js", headers={"Accept-Encoding": refused})
+        assert "Content-Encoding" not in response.headers
+
+
+def test_errors_are_left_alone(client):
+    response = client.get("/assets/missing.js", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 404
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" not in response.vary
+
+
+def test_compressed_asset_etag_is_weak_and_revalidates(client):
+    identity = client.get("/assets/app.js")
+    etag, weak = identity.get_etag()
+    assert not weak
+
+    compressed = client.get("/assets/app.js", headers={"Accept-Encoding": "gzip"})
+    assert compressed.get_etag() == (etag, True)
+
+    revalidated = client.get("/assets/app.js", headers={
+        "Accept-Encoding": "gzip", "If-None-Match": compressed.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert client.get("/assets/app.js", headers={"If-None-Match": identity.headers["ETag"]}).status_code == 304
+
+
+def test_report_data_etag_changes_after_a_write(client):
+    first = client.get("/reports/data")
+    assert first.status_code == 200
+    assert first.get_etag()[1]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    assert client.get("/reports/data", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    name = "http-" + uuid.uuid4().hex
+    client.post("/create_account", data={"name": name})
+    client.post("/deposit", data={"account": name, "amount": "25"})
+
+    second = client.get("/reports/data", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert client.get("/reports/data", headers={"If-None-Match": second.headers["ETag"]}).status_code == 304
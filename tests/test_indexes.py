@@ -0,0 +1,146 @@
+import random
+from datetime import date, timedelta
+
+import app
+
+
+def random_day(rng, start=date(2018, 1, 1), span=3000):
+    return start + timedelta(days=rng.randint(0, span))
+
+
+def test_fenwick_range_sums_match_naive_scan():
+    rng = random.Random(26)
+    tree = app.FenwickTree(date(2020, 1, 1).toordinal(), [0] * 64)
+    buckets = {}
+    for step in range(2000):
+        # Days on both sides of the initial base exercise growth in either direction.
+        day = random_day(rng)
+        delta = rng.randint(-50, 100)
+        tree = tree.add(day, delta)
+        buckets[day] = buckets.get(day, 0) + delta
+        if step % 100 == 0:
+            for _ in range(20):
+                start = random_day(rng, date(2017, 6, 1), 4000)
+                end = start + timedelta(days=rng.randint(0, 900))
+                expected = sum(v for d, v in buckets.items() if start <= d <= end)
+                assert tree.range_sum(start, end) == expected
+    assert tree.range_sum() == sum(buckets.values())
+    assert tree.range_sum(end=date.min) == 0
+    assert tree.range_sum(start=date.max) == 0
+    assert tree.range_sum(date(2021, 1, 1), date(2020, 1, 1)) == 0
+
+
+def test_fenwick_add_leaves_original_unchanged():
+    tree = app.FenwickTree(date(2024, 1, 1).toordinal(), [0] * 64)
+    tree = tree.add(date(2024, 1, 10), 5)
+    grown = tree.add(date(2030, 1, 1), 7)
+    patched = tree.add(date(2024, 1, 10), 3)
+    assert tree.range_sum() == 5
+    assert grown.range_sum() == 12
+    assert patched.range_sum() == 8
+
+
+def test_fenwick_from_daily_matches_incremental_adds():
+    rng = random.Random(7)
+    totals = {}
+    tree = None
+    for _ in range(500):
+        day = random_day(rng)
+        amount = rng.randint(1, 40)
+        totals[day] = totals.get(day, 0) + amount
+        tree = tree.add(day, amount) if tree else app.FenwickTree(day.toordinal(), [0] * 64).add(day, amount)
+    built = app.FenwickTree.from_daily(totals)
+    for _ in range(200):
+        start = random_day(rng)
+        end = start + timedelta(days=rng.randint(0, 400))
+        assert built.range_sum(start, end) == tree.range_sum(start, end)
+
+
+def test_ledger_index_totals_match_naive_scan():
+    rng = random.Random(126)
+    index = app.LedgerIndex()
+    live = {}
+    for i in range(1500):
+        if live and rng.random() < 0.25:
+            txid = rng.choice(list(live))
+            acc, tx = live.pop(txid)
+            index = index.remove(acc, tx)
+            continue
+        acc = rng.choice(["a", "b", "c"])
+        tx = {
+            "id": str(i),
+            "type": rng.choice(["Deposit", "Expense", "Withdraw", "Transfer In", "Transfer Out"]),
+            "category": rng.choice(app.CATEGORIES),
+            "amount": rng.randint(1, 100),
+            "date": random_day(rng).isoformat() + "T12:00:00",
+        }
+        index = index.add(acc, tx)
+        live[tx["id"]] = (acc, tx)
+    for _ in range(200):
+        account = rng.choice([None, "a", "b", "c"])
+        category = rng.choice([None] + app.CATEGORIES)
+        flow = rng.choice(["income", "expense"])
+        start = random_day(rng)
+        end = start + timedelta(days=rng.randint(0, 700))
+        expected = sum(
+            tx["amount"] for acc, tx in live.values()
+            if (account is None or acc == account)
+            and (category is None or tx["category"] == category)
+            and app.tx_flow(tx) == flow
+            and start <= app.tx_day(tx) <= end
+        )
+        assert index.total(account, category, start, end, flow=flow) == expected
+
+
+def test_balance_timeline_matches_naive_scan(monkeypatch):
+    # Small blocks so splits and emptied blocks happen often.
+    monkeypatch.setattr(app.BalanceTimeline, "BLOCK_SIZE", 4)
+    rng = random.Random(30)
+    timeline = app.BalanceTimeline()
+    entries = {}
+    for step in range(3000):
+        if entries and rng.random() < 0.35:
+            key = rng.choice(list(entries))
+            timeline = timeline.remove(key)
+            del entries[key]
+        else:
+            key = (random_day(rng).isoformat() + "T12:00:00", str(step))
+            entries[key] = rng.randint(-100, 100)
+            timeline = timeline.insert(key, entries[key])
+        if step % 100 == 0:
+            for _ in range(20):
+                day = random_day(rng, date(2017, 6, 1), 4000)
+                expected = sum(v for (d, _), v in entries.items() if d[:10] <= day.isoformat())
+                assert timeline.balance_at(day) == expected
+            assert timeline.current() == sum(entries.values())
+    assert timeline.balance_at(date.max) == timeline.current()
+    assert timeline.balance_at(date.min) == 0
+
+
+def test_balance_timeline_build_and_copy_on_write():
+    rng = random.Random(3)
+    entries = [((random_day(rng).isoformat(), str(i)), rng.randint(-20, 50)) for i in range(1000)]
+    built = app.BalanceTimeline.build(entries)
+    incremental = app.BalanceTimeline()
+    for key, delta in entries:
+        incremental = incremental.insert(key, delta)
+    for _ in range(200):
+        day = random_day(rng)
+        assert built.balance_at(day) == incremental.balance_at(day)
+
+    before = built.current()
+    changed = built.insert(("2000-01-01", "new"), 10).remove(entries[0][0])
+    assert built.current() == before
+    assert changed.current() == before + 10 - entries[0][1]
+
+
+def test_balance_series_skips_unparseable_dates():
+    timelines = app.build_timelines({"a": [
+        {"id": "x", "type": "Deposit", "amount": 10, "date": "03/01/2024"},
+        {"id": "y", "type": "Deposit", "amount": 5, "date": "2024-03-01T00:00:00"},
+        {"id": "z", "type": "Expense", "amount": 2, "date": "2024-05-01T00:00:00"},
+    ]})
+    series = timelines["a"].series(points=10)
+    assert series[0] == ("2024-03-01", 5)
+    assert series[-1] == ("2024-05-01", 3)
+    assert len(series) <= 10
@@ -0,0 +1,93 @@
+import copy
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def small_store(monkeypatch):
+    # Small chunks and few shards so writes cross chunk and shard boundaries.
+    monkeypatch.setattr(app.TransactionStore, "CHUNK_SIZE", 3)
+    monkeypatch.setattr(app.ShardedMap, "SHARDS", 4)
+
+
+def make_tx(rng, i):
+    return {
+        "id": str(i),
+        "type": rng.choice(["Deposit", "Expense", "Withdraw", "Transfer In", "Transfer Out"]),
+        "category": rng.choice(app.CATEGORIES),
+        "amount": rng.randint(1, 100),
+        "date": (date(2024, 1, 1) + timedelta(days=rng.randint(0, 400))).isoformat() + "T12:00:00",
+    }
+
+
+def assert_consistent(snapshot):
+    """The snapshot's index and timelines agree with a scan of its own chunks."""
+    data = snapshot.to_dict()
+    for account in [None] + list(data):
+        txs = [t for acc, tlist in data.items() if account in (None, acc) for t in tlist]
+        for flow in ("income", "expense"):
+            for category in app.CATEGORIES:
+                expected = sum(t["amount"] for t in txs if t["category"] == category and app.tx_flow(t) == flow)
+                assert snapshot.index.total(account, category, flow=flow) == expected
+        if account is not None:
+            expected = sum(t["amount"] if app.tx_flow(t) == "income" else -t["amount"] for t in txs)
+            assert snapshot.timelines.get(account, app.BalanceTimeline()).current() == expected
+
+
+def test_pinned_snapshot_is_unchanged_by_later_writes():
+    rng = random.Random(28)
+    store = app.TransactionStore({"a": [make_tx(rng, i) for i in range(10)], "b": []})
+    live = {acc: list(store.snapshot().get(acc)) for acc in ("a", "b")}
+    pinned = []
+    for i in range(10, 300):
+        snapshot = store.snapshot()
+        pinned.append((snapshot, copy.deepcopy(snapshot.to_dict())))
+        acc = rng.choice(["a", "b", "c"])
+        op = rng.random()
+        if op < 0.5 or not live.get(acc):
+            tx = make_tx(rng, i)
+            store.append(acc, tx)
+            live.setdefault(acc, []).append(tx)
+        elif op < 0.75:
+            old = rng.choice(live[acc])
+            new_acc = rng.choice(["a", "b", "c"])
+            new = dict(old, amount=rng.randint(1, 100))
+            assert store.replace(acc, old, new_acc, new)
+            live[acc].remove(old)
+            live.setdefault(new_acc, []).append(new)
+        else:
+            tx = rng.choice(live[acc])
+            assert store.remove(acc, tx)
+            live[acc].remove(tx)
+    for snapshot, data in pinned[::10]:
+        assert snapshot.to_dict() == data
+        assert_consistent(snapshot)
+    current = store.snapshot()
+    assert_consistent(current)
+    assert {acc: sorted(t["id"] for t in tlist) for acc, tlist in current.to_dict().items()} == \
+           {acc: sorted(t["id"] for t in tlist) for acc, tlist in live.items()}
+
+
+def test_stale_remove_and_replace_change_nothing():
+    rng = random.Random(280)
+    rent = dict(make_tx(rng, 0), type="Expense", category="Rent", amount=50)
+    store = app.TransactionStore({"x": [rent, make_tx(rng, 1)]})
+    assert store.remove("x", rent)
+    after_remove = store.snapshot()
+    assert not store.remove("x", rent)
+    assert not store.replace("x", rent, "x", dict(rent, amount=10))
+    assert store.snapshot() is after_remove
+    assert after_remove.index.total("x", "Rent") == 0
+
+    tx = store.find("x", "1")
+    assert store.replace("x", tx, "x", dict(tx, amount=7))
+    after_replace = store.snapshot()
+    # The first edit already swapped the stored version out from under this one.
+    assert not store.replace("x", tx, "y", dict(tx, amount=9))
+    assert not store.remove("x", tx)
+    assert store.snapshot() is after_replace
+    assert_consistent(after_replace)